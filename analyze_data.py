@@ -5,29 +5,91 @@ Analyzes the dataset for anomalies, inconsistencies, and patterns
 """
 import httpx
 import asyncio
-import json
+import io
+import orjson
+import os
+import sys
 from collections import Counter, defaultdict
 from datetime import datetime
 import re
 
+try:
+    import ahocorasick  # optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    # optional: pip install ciso8601 (C parser, handles a trailing 'Z' natively)
+    from ciso8601 import parse_datetime as parse_timestamp
+except ImportError:
+    def parse_timestamp(ts):
+        return datetime.fromisoformat(ts.replace('Z', '+00:00'))
+
 # Correct URL with trailing slash
 MEMBER_API_URL = "https://november7-730026606190.europe-west1.run.app/messages"
 
+# Content patterns, compiled once at import time
+DATE_RE = re.compile(
+    r'\b\d{4}-\d{2}-\d{2}\b'
+    r'|\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2},? \d{4}\b'
+    r'|\b\d{1,2}/\d{1,2}/\d{4}\b',
+    re.IGNORECASE,
+)
+NUM_RE = re.compile(r'\b\d+\b')
+
+TOPIC_KEYWORDS = {
+    "travel": ['trip', 'travel', 'flight', 'hotel', 'vacation', 'visit', 'booking'],
+    "food": ['restaurant', 'dinner', 'lunch', 'reservation', 'table', 'chef', 'menu'],
+    "events": ['ticket', 'concert', 'show', 'performance', 'event', 'seats'],
+}
+
+def _build_topic_automaton():
+    """Build one Aho-Corasick automaton over every topic keyword, if available"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for topic, keywords in TOPIC_KEYWORDS.items():
+        for keyword in keywords:
+            automaton.add_word(keyword, topic)
+    automaton.make_automaton()
+    return automaton
+
+TOPIC_AUTOMATON = _build_topic_automaton()
+
+def find_topics(text):
+    """Return the topics whose keywords appear in an already-lowercased text"""
+    if TOPIC_AUTOMATON is not None:
+        return {topic for _, topic in TOPIC_AUTOMATON.iter(text)}
+    return {topic for topic, keywords in TOPIC_KEYWORDS.items()
+            if any(kw in text for kw in keywords)}
+
+# Same order as the values _scan() reads per item
+EXPECTED_FIELDS = ("id", "user_id", "user_name", "timestamp", "message")
+
 class DataAnalyzer:
     def __init__(self, data):
         self.data = data
         self.items = data.get("items", [])
         self.total = data.get("total", 0)
         self.findings = []
+        # Report text is buffered and written to stdout once, in print_summary
+        self._out = io.StringIO()
         
+    def _p(self, line=""):
+        """Append a line to the report buffer"""
+        self._out.write(line)
+        self._out.write("\n")
+    
     def analyze_all(self):
         """Run all analysis checks"""
-        print("=" * 80)
-        print("DATA ANALYSIS REPORT")
-        print("=" * 80)
-        print(f"\nTotal messages: {self.total}")
-        print(f"Messages retrieved: {len(self.items)}")
-        print("\n")
+        self._p("=" * 80)
+        self._p("DATA ANALYSIS REPORT")
+        self._p("=" * 80)
+        self._p(f"\nTotal messages: {self.total}")
+        self._p(f"Messages retrieved: {len(self.items)}")
+        self._p("\n")
+        
+        self._scan()
         
         self.check_schema_consistency()
         self.check_data_types()
@@ -39,323 +101,398 @@ class DataAnalyzer:
         
         self.print_summary()
     
+    def _scan(self):
+        """Walk the items once and collect everything the checks report on"""
+        schema_counts = Counter()
+        missing_fields = []
+        field_types = defaultdict(set)
+        user_name_counts = Counter()
+        user_ids = set()
+        # user_id -> name, or a tuple of names once a second one shows up
+        user_mapping = {}
+        timestamp_count = 0
+        parsed_dates = []
+        parse_errors = []
+        message_count = 0
+        total_length = 0
+        min_length = None
+        max_length = None
+        empty_messages = 0
+        messages_with_dates = 0
+        messages_with_numbers = 0
+        topic_counts = Counter()
+        id_counts = Counter()
+        message_counts = Counter()
+        
+        for item in self.items:
+            schema_counts[tuple(sorted(item))] += 1
+            for key, value in item.items():
+                field_types[key].add(type(value).__name__)
+            
+            # Look each field up once; every check below reuses these
+            msg_id = item.get("id")
+            user_id = item.get("user_id")
+            user_name = item.get("user_name")
+            ts = item.get("timestamp")
+            msg = item.get("message", "")
+            
+            for field, value in zip(EXPECTED_FIELDS, (msg_id, user_id, user_name, ts, msg)):
+                if value is None or value == "":
+                    missing_fields.append((item.get("id", "unknown"), field))
+            
+            if msg_id:
+                id_counts[msg_id] += 1
+            
+            if user_name:
+                user_name_counts[user_name] += 1
+            if user_id:
+                user_ids.add(user_id)
+                if user_name:
+                    prev = user_mapping.get(user_id)
+                    if prev is None:
+                        user_mapping[user_id] = user_name
+                    elif isinstance(prev, str):
+                        if prev != user_name:
+                            user_mapping[user_id] = (prev, user_name)
+                    elif user_name not in prev:
+                        user_mapping[user_id] = prev + (user_name,)
+            
+            if ts:
+                timestamp_count += 1
+                if not isinstance(ts, str):
+                    parse_errors.append(ts)
+                else:
+                    try:
+                        parsed_dates.append(parse_timestamp(ts))
+                    except ValueError:
+                        parse_errors.append(ts)
+            
+            length = len(msg)
+            message_count += 1
+            total_length += length
+            if min_length is None or length < min_length:
+                min_length = length
+            if max_length is None or length > max_length:
+                max_length = length
+            if not msg:
+                empty_messages += 1
+                continue
+            message_counts[msg] += 1
+            if msg.isspace():
+                empty_messages += 1
+        
+        # Content patterns only depend on the text, so check each distinct
+        # message once and weight the result by how often it appears
+        for msg, count in message_counts.items():
+            if msg.isspace():
+                # Whitespace-only: nothing for the pattern checks to find
+                continue
+            if DATE_RE.search(msg):
+                messages_with_dates += count
+            if NUM_RE.search(msg):
+                messages_with_numbers += count
+            for topic in find_topics(msg.lower()):
+                topic_counts[topic] += count
+        
+        self._schema_counts = schema_counts
+        self._missing_fields = missing_fields
+        # Plain dicts so later lookups can't insert empty entries
+        self._field_types = dict(field_types)
+        self._user_name_counts = user_name_counts
+        self._user_ids = user_ids
+        self._user_mapping = user_mapping
+        self._timestamp_count = timestamp_count
+        self._parsed_dates = parsed_dates
+        self._parse_errors = parse_errors
+        self._message_count = message_count
+        self._total_length = total_length
+        self._min_length = min_length or 0
+        self._max_length = max_length or 0
+        self._empty_messages = empty_messages
+        self._messages_with_dates = messages_with_dates
+        self._messages_with_numbers = messages_with_numbers
+        self._topic_counts = topic_counts
+        self._id_counts = id_counts
+        self._message_counts = message_counts
+    
+    def member_names(self):
+        """Sorted names of the members seen by the last scan"""
+        return sorted(self._user_name_counts)
+    
     def check_schema_consistency(self):
         """Check if all items have consistent schema"""
-        print("1. Schema Consistency Check")
-        print("-" * 80)
+        self._p("1. Schema Consistency Check")
+        self._p("-" * 80)
         
-        expected_fields = {"id", "user_id", "user_name", "timestamp", "message"}
-        schemas = [set(item.keys()) for item in self.items]
+        schema_counts = self._schema_counts
         
-        unique_schemas = set(tuple(sorted(s)) for s in schemas)
-        
-        if len(unique_schemas) == 1:
-            print("✓ All messages have consistent schema")
-            schema = list(unique_schemas)[0]
-            print(f"  Fields: {', '.join(schema)}")
+        if len(schema_counts) == 1:
+            self._p("✓ All messages have consistent schema")
+            schema = next(iter(schema_counts))
+            self._p(f"  Fields: {', '.join(schema)}")
         else:
-            print("✗ Inconsistent schemas detected!")
-            for schema in unique_schemas:
-                count = sum(1 for s in schemas if tuple(sorted(s)) == schema)
-                print(f"  Schema variant ({count} messages): {', '.join(schema)}")
+            self._p("✗ Inconsistent schemas detected!")
+            for schema, count in schema_counts.items():
+                self._p(f"  Schema variant ({count} messages): {', '.join(schema)}")
             self.findings.append("Inconsistent schemas across messages")
         
         # Check for missing fields
-        missing_fields = []
-        for item in self.items:
-            for field in expected_fields:
-                if field not in item or item[field] is None or item[field] == "":
-                    missing_fields.append((item.get("id", "unknown"), field))
+        missing_fields = self._missing_fields
         
         if missing_fields:
-            print(f"\n✗ Found {len(missing_fields)} missing/empty fields")
+            self._p(f"\n✗ Found {len(missing_fields)} missing/empty fields")
             for msg_id, field in missing_fields[:5]:
-                print(f"  Message {msg_id}: missing '{field}'")
+                self._p(f"  Message {msg_id}: missing '{field}'")
             if len(missing_fields) > 5:
-                print(f"  ... and {len(missing_fields) - 5} more")
+                self._p(f"  ... and {len(missing_fields) - 5} more")
             self.findings.append(f"{len(missing_fields)} missing/empty fields")
         else:
-            print("\n✓ No missing or empty fields detected")
+            self._p("\n✓ No missing or empty fields detected")
         
-        print()
+        self._p()
     
     def check_data_types(self):
         """Check data type consistency"""
-        print("2. Data Type Consistency Check")
-        print("-" * 80)
-        
-        field_types = defaultdict(set)
-        for item in self.items:
-            for key, value in item.items():
-                field_types[key].add(type(value).__name__)
+        self._p("2. Data Type Consistency Check")
+        self._p("-" * 80)
         
         inconsistent = False
-        for field, types in field_types.items():
+        for field, types in self._field_types.items():
             if len(types) > 1:
-                print(f"✗ Field '{field}' has multiple types: {', '.join(types)}")
+                self._p(f"✗ Field '{field}' has multiple types: {', '.join(types)}")
                 inconsistent = True
                 self.findings.append(f"Field '{field}' has inconsistent types")
         
         if not inconsistent:
-            print("✓ All fields have consistent data types")
+            self._p("✓ All fields have consistent data types")
         
-        print()
+        self._p()
     
     def check_user_names(self):
         """Check for user name inconsistencies"""
-        print("3. User Name Analysis")
-        print("-" * 80)
+        self._p("3. User Name Analysis")
+        self._p("-" * 80)
         
-        user_names = [item.get("user_name") for item in self.items if item.get("user_name")]
-        user_ids = [item.get("user_id") for item in self.items if item.get("user_id")]
+        user_name_counts = self._user_name_counts
         
-        unique_names = set(user_names)
-        unique_ids = set(user_ids)
-        
-        print(f"Unique user names: {len(unique_names)}")
-        print(f"Unique user IDs: {len(unique_ids)}")
+        self._p(f"Unique user names: {len(user_name_counts)}")
+        self._p(f"Unique user IDs: {len(self._user_ids)}")
         
         # List all unique users
-        print(f"\nAll members:")
-        for name in sorted(unique_names):
-            count = user_names.count(name)
-            print(f"  - {name}: {count} message(s)")
+        self._p(f"\nAll members:")
+        for name, count in sorted(user_name_counts.items()):
+            self._p(f"  - {name}: {count} message(s)")
         
         name_patterns = defaultdict(list)
-        for name in unique_names:
+        for name in user_name_counts:
             first_name = name.split()[0] if name else ""
             name_patterns[first_name.lower()].append(name)
         
         potential_duplicates = {k: v for k, v in name_patterns.items() if len(v) > 1}
         if potential_duplicates:
-            print(f"\n✗ Potential name variations detected:")
+            self._p(f"\n✗ Potential name variations detected:")
             for base_name, variations in list(potential_duplicates.items())[:5]:
-                print(f"  {base_name}: {', '.join(variations)}")
+                self._p(f"  {base_name}: {', '.join(variations)}")
             self.findings.append(f"{len(potential_duplicates)} potential name variations")
         else:
-            print("\n✓ No obvious name variations detected")
-        
-        user_mapping = defaultdict(set)
-        for item in self.items:
-            user_id = item.get("user_id")
-            user_name = item.get("user_name")
-            if user_id and user_name:
-                user_mapping[user_id].add(user_name)
+            self._p("\n✓ No obvious name variations detected")
         
-        inconsistent_mappings = {k: v for k, v in user_mapping.items() if len(v) > 1}
+        inconsistent_mappings = {k: v for k, v in self._user_mapping.items() if isinstance(v, tuple)}
         if inconsistent_mappings:
-            print(f"\n✗ User IDs with multiple names:")
+            self._p(f"\n✗ User IDs with multiple names:")
             for user_id, names in list(inconsistent_mappings.items())[:3]:
-                print(f"  User {user_id}: {', '.join(names)}")
+                self._p(f"  User {user_id}: {', '.join(names)}")
             self.findings.append(f"{len(inconsistent_mappings)} user IDs with multiple names")
         
-        print()
+        self._p()
     
     def check_timestamps(self):
         """Check timestamp format and validity"""
-        print("4. Timestamp Analysis")
-        print("-" * 80)
+        self._p("4. Timestamp Analysis")
+        self._p("-" * 80)
         
-        timestamps = [item.get("timestamp") for item in self.items if item.get("timestamp")]
-        
-        parsed_dates = []
-        parse_errors = []
-        
-        for ts in timestamps:
-            try:
-                dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-                parsed_dates.append(dt)
-            except:
-                parse_errors.append(ts)
+        parsed_dates = self._parsed_dates
+        parse_errors = self._parse_errors
         
         if parse_errors:
-            print(f"✗ Failed to parse {len(parse_errors)} timestamps")
+            self._p(f"✗ Failed to parse {len(parse_errors)} timestamps")
             for ts in parse_errors[:3]:
-                print(f"  {ts}")
+                self._p(f"  {ts}")
             self.findings.append(f"{len(parse_errors)} unparseable timestamps")
         else:
-            print(f"✓ All {len(timestamps)} timestamps parsed successfully")
+            self._p(f"✓ All {self._timestamp_count} timestamps parsed successfully")
         
         if parsed_dates:
             earliest = min(parsed_dates)
             latest = max(parsed_dates)
-            print(f"\nDate range:")
-            print(f"  Earliest: {earliest.strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"  Latest: {latest.strftime('%Y-%m-%d %H:%M:%S')}")
+            self._p(f"\nDate range:")
+            self._p(f"  Earliest: {earliest.strftime('%Y-%m-%d %H:%M:%S')}")
+            self._p(f"  Latest: {latest.strftime('%Y-%m-%d %H:%M:%S')}")
             
             now = datetime.now(parsed_dates[0].tzinfo)
             future_dates = [d for d in parsed_dates if d > now]
             if future_dates:
-                print(f"\n✗ Found {len(future_dates)} messages with future timestamps")
+                self._p(f"\n✗ Found {len(future_dates)} messages with future timestamps")
                 self.findings.append(f"{len(future_dates)} future timestamps")
             else:
-                print(f"\n✓ No future timestamps detected")
+                self._p(f"\n✓ No future timestamps detected")
         
-        print()
+        self._p()
     
     def check_message_content(self):
         """Analyze message content"""
-        print("5. Message Content Analysis")
-        print("-" * 80)
+        self._p("5. Message Content Analysis")
+        self._p("-" * 80)
         
-        messages = [item.get("message", "") for item in self.items]
+        message_count = self._message_count
+        avg_length = self._total_length / message_count if message_count else 0
         
-        lengths = [len(msg) for msg in messages]
-        avg_length = sum(lengths) / len(lengths) if lengths else 0
+        self._p(f"Total messages: {message_count}")
+        self._p(f"Average message length: {avg_length:.1f} characters")
+        self._p(f"Shortest message: {self._min_length} characters")
+        self._p(f"Longest message: {self._max_length} characters")
         
-        print(f"Total messages: {len(messages)}")
-        print(f"Average message length: {avg_length:.1f} characters")
-        print(f"Shortest message: {min(lengths) if lengths else 0} characters")
-        print(f"Longest message: {max(lengths) if lengths else 0} characters")
-        
-        empty_messages = sum(1 for msg in messages if not msg or msg.strip() == "")
+        empty_messages = self._empty_messages
         if empty_messages:
-            print(f"\n✗ Found {empty_messages} empty messages")
+            self._p(f"\n✗ Found {empty_messages} empty messages")
             self.findings.append(f"{empty_messages} empty messages")
         else:
-            print(f"\n✓ No empty messages detected")
-        
-        print("\nContent pattern analysis:")
+            self._p(f"\n✓ No empty messages detected")
         
-        date_patterns = [
-            r'\b\d{4}-\d{2}-\d{2}\b',
-            r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2},? \d{4}\b',
-            r'\b\d{1,2}/\d{1,2}/\d{4}\b'
-        ]
+        self._p("\nContent pattern analysis:")
         
-        messages_with_dates = sum(1 for msg in messages 
-                                  if any(re.search(pattern, msg, re.IGNORECASE) 
-                                       for pattern in date_patterns))
-        print(f"  Messages with dates: {messages_with_dates} ({messages_with_dates/len(messages)*100:.1f}%)")
+        messages_with_dates = self._messages_with_dates
+        self._p(f"  Messages with dates: {messages_with_dates} ({messages_with_dates/message_count*100:.1f}%)")
         
-        messages_with_numbers = sum(1 for msg in messages if re.search(r'\b\d+\b', msg))
-        print(f"  Messages with numbers: {messages_with_numbers} ({messages_with_numbers/len(messages)*100:.1f}%)")
+        messages_with_numbers = self._messages_with_numbers
+        self._p(f"  Messages with numbers: {messages_with_numbers} ({messages_with_numbers/message_count*100:.1f}%)")
         
         # Topic detection
-        travel_keywords = ['trip', 'travel', 'flight', 'hotel', 'vacation', 'visit', 'booking']
-        food_keywords = ['restaurant', 'dinner', 'lunch', 'reservation', 'table', 'chef', 'menu']
-        event_keywords = ['ticket', 'concert', 'show', 'performance', 'event', 'seats']
-        
-        travel_msgs = sum(1 for msg in messages if any(kw in msg.lower() for kw in travel_keywords))
-        food_msgs = sum(1 for msg in messages if any(kw in msg.lower() for kw in food_keywords))
-        event_msgs = sum(1 for msg in messages if any(kw in msg.lower() for kw in event_keywords))
+        topic_counts = self._topic_counts
+        travel_msgs = topic_counts["travel"]
+        food_msgs = topic_counts["food"]
+        event_msgs = topic_counts["events"]
         
-        print(f"\nTopic distribution:")
-        print(f"  Travel-related: {travel_msgs} messages ({travel_msgs/len(messages)*100:.1f}%)")
-        print(f"  Food/Dining: {food_msgs} messages ({food_msgs/len(messages)*100:.1f}%)")
-        print(f"  Events/Entertainment: {event_msgs} messages ({event_msgs/len(messages)*100:.1f}%)")
+        self._p(f"\nTopic distribution:")
+        self._p(f"  Travel-related: {travel_msgs} messages ({travel_msgs/message_count*100:.1f}%)")
+        self._p(f"  Food/Dining: {food_msgs} messages ({food_msgs/message_count*100:.1f}%)")
+        self._p(f"  Events/Entertainment: {event_msgs} messages ({event_msgs/message_count*100:.1f}%)")
         
-        print()
+        self._p()
     
     def check_duplicates(self):
         """Check for duplicate messages"""
-        print("6. Duplicate Detection")
-        print("-" * 80)
+        self._p("6. Duplicate Detection")
+        self._p("-" * 80)
         
-        ids = [item.get("id") for item in self.items if item.get("id")]
-        id_counts = Counter(ids)
-        duplicate_ids = {k: v for k, v in id_counts.items() if v > 1}
+        duplicate_ids = {k: v for k, v in self._id_counts.items() if v > 1}
         
         if duplicate_ids:
-            print(f"✗ Found {len(duplicate_ids)} duplicate message IDs")
+            self._p(f"✗ Found {len(duplicate_ids)} duplicate message IDs")
             for msg_id, count in list(duplicate_ids.items())[:3]:
-                print(f"  ID {msg_id}: appears {count} times")
+                self._p(f"  ID {msg_id}: appears {count} times")
             self.findings.append(f"{len(duplicate_ids)} duplicate message IDs")
         else:
-            print("✓ No duplicate message IDs found")
+            self._p("✓ No duplicate message IDs found")
         
-        messages = [item.get("message") for item in self.items if item.get("message")]
-        message_counts = Counter(messages)
-        duplicate_messages = {k: v for k, v in message_counts.items() if v > 1}
+        duplicate_messages = {k: v for k, v in self._message_counts.items() if v > 1}
         
         if duplicate_messages:
-            print(f"\n✗ Found {len(duplicate_messages)} duplicate messages")
+            self._p(f"\n✗ Found {len(duplicate_messages)} duplicate messages")
             for msg, count in list(duplicate_messages.items())[:3]:
                 preview = msg[:50] + "..." if len(msg) > 50 else msg
-                print(f"  '{preview}': appears {count} times")
+                self._p(f"  '{preview}': appears {count} times")
             self.findings.append(f"{len(duplicate_messages)} duplicate message contents")
         else:
-            print("\n✓ No duplicate message content found")
+            self._p("\n✓ No duplicate message content found")
         
-        print()
+        self._p()
     
     def extract_insights(self):
         """Extract interesting insights from the data"""
-        print("7. Data Insights & Member Activity")
-        print("-" * 80)
+        self._p("7. Data Insights & Member Activity")
+        self._p("-" * 80)
         
-        user_counts = Counter(item.get("user_name") for item in self.items if item.get("user_name"))
-        print(f"\nMember activity (sorted by message count):")
-        for user, count in user_counts.most_common():
-            print(f"  {user}: {count} message(s)")
+        self._p(f"\nMember activity (sorted by message count):")
+        for user, count in self._user_name_counts.most_common():
+            self._p(f"  {user}: {count} message(s)")
         
-        print()
+        self._p()
     
     def print_summary(self):
         """Print summary of findings"""
-        print("=" * 80)
-        print("SUMMARY OF FINDINGS")
-        print("=" * 80)
+        self._p("=" * 80)
+        self._p("SUMMARY OF FINDINGS")
+        self._p("=" * 80)
         
         if self.findings:
-            print(f"\nIdentified {len(self.findings)} data quality observations:")
+            self._p(f"\nIdentified {len(self.findings)} data quality observations:")
             for i, finding in enumerate(self.findings, 1):
-                print(f"  {i}. {finding}")
+                self._p(f"  {i}. {finding}")
         else:
-            print("\n✓ No data quality issues detected!")
-            print("  - All schemas are consistent")
-            print("  - All data types are uniform")
-            print("  - No duplicate IDs or messages")
-            print("  - All timestamps are valid")
-            print("  - No empty messages")
-        
-        print("\n" + "=" * 80)
+            self._p("\n✓ No data quality issues detected!")
+            self._p("  - All schemas are consistent")
+            self._p("  - All data types are uniform")
+            self._p("  - No duplicate IDs or messages")
+            self._p("  - All timestamps are valid")
+            self._p("  - No empty messages")
+        
+        self._p("\n" + "=" * 80)
+        
+        sys.stdout.write(self._out.getvalue())
+        sys.stdout.flush()
+        self._out = io.StringIO()
 
 async def fetch_and_analyze():
     """Fetch data and run analysis"""
     print("Fetching data from API...")
     print(f"URL: {MEMBER_API_URL}\n")
     
-    async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-        try:
+    try:
+        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
             response = await client.get(MEMBER_API_URL)
-            response.raise_for_status()
-            data = response.json()
-            
-            print(f"✓ Successfully fetched data")
-            print(f"  Status code: {response.status_code}")
-            print(f"  Total messages in API: {data.get('total', 0)}")
-            print(f"  Messages in this response: {len(data.get('items', []))}\n")
-            
-            if not data.get("items"):
-                print("⚠️ Warning: No messages found in the response")
-                return
-            
-            analyzer = DataAnalyzer(data)
-            analyzer.analyze_all()
-            
-            # Save results
-            result_data = {
-                "total_messages": data.get("total", 0),
-                "messages_analyzed": len(data.get("items", [])),
-                "unique_members": len(set(item.get("user_name") for item in data.get("items", []) if item.get("user_name"))),
-                "findings": analyzer.findings,
-                "member_list": sorted(set(item.get("user_name") for item in data.get("items", []) if item.get("user_name"))),
-                "timestamp": datetime.now().isoformat(),
-                "analysis_status": "completed"
-            }
-            
-            with open("data_analysis_results.json", "w") as f:
-                json.dump(result_data, f, indent=2)
-            
-            print("\n✓ Analysis results saved to data_analysis_results.json")
-            
-        except httpx.HTTPStatusError as e:
-            print(f"✗ HTTP Error: {e.response.status_code}")
-            print(f"  URL: {e.request.url}")
-            print(f"  Response: {e.response.text[:200]}")
-        except Exception as e:
-            print(f"✗ Error fetching data: {type(e).__name__}: {str(e)}")
+        response.raise_for_status()
+        data = response.json()
+        
+        print(f"✓ Successfully fetched data")
+        print(f"  Status code: {response.status_code}")
+        print(f"  Total messages in API: {data.get('total', 0)}")
+        print(f"  Messages in this response: {len(data.get('items', []))}\n")
+        
+        if not data.get("items"):
+            print("⚠️ Warning: No messages found in the response")
+            return
+        
+        analyzer = DataAnalyzer(data)
+        analyzer.analyze_all()
+        
+        # Save results, reusing the counts gathered during the scan
+        member_list = analyzer.member_names()
+        result_data = {
+            "total_messages": data.get("total", 0),
+            "messages_analyzed": len(data.get("items", [])),
+            "unique_members": len(member_list),
+            "findings": analyzer.findings,
+            "member_list": member_list,
+            "timestamp": datetime.now().isoformat(),
+            "analysis_status": "completed"
+        }
+        
+        # Write to a temp file and rename so a crash never leaves a partial file
+        results_path = "data_analysis_results.json"
+        tmp_path = results_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(result_data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, results_path)
+        
+        print(f"\n✓ Analysis results saved to {results_path}")
+        
+    except httpx.HTTPStatusError as e:
+        print(f"✗ HTTP Error: {e.response.status_code}")
+        print(f"  URL: {e.request.url}")
+        print(f"  Response: {e.response.text[:200]}")
+    except Exception as e:
+        print(f"✗ Error fetching data: {type(e).__name__}: {str(e)}")
 
 if __name__ == "__main__":
     asyncio.run(fetch_and_analyze())
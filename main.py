@@ -1,12 +1,36 @@
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
+import asyncio
 import httpx
 import os
-from typing import Dict, Any
-import json
-
-app = FastAPI(title="Member QA System")
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Any, Generic, List, Optional, Set, Tuple, TypeVar
+import orjson
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open pooled HTTP clients once and share them across requests."""
+    limits = httpx.Limits(max_keepalive_connections=20)
+    app.state.member_client = httpx.AsyncClient(
+        timeout=30.0, follow_redirects=True, http2=True, limits=limits
+    )
+    app.state.anthropic_client = httpx.AsyncClient(
+        timeout=CLAUDE_TIMEOUT, http2=True, limits=limits
+    )
+    try:
+        yield
+    finally:
+        await app.state.member_client.aclose()
+        await app.state.anthropic_client.aclose()
+
+
+app = FastAPI(title="Member QA System", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -22,8 +46,30 @@ app.add_middleware(
 MEMBER_API_URL = "https://november7-730026606190.europe-west1.run.app/messages"
 ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
 
+# Seconds allowed per question's worth of Claude output; batches scale it up
+CLAUDE_TIMEOUT = 60.0
+
+# How long (seconds) to reuse fetched member data when the API sends no ETag
+MEMBER_CACHE_TTL = 60.0
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Last successful member data fetch, revalidated with If-None-Match
+_CACHE: Dict[str, Any] = {"etag": None, "data": None, "fetched_at": 0.0}
+
+# Completed answers, keyed by (question, member data ETag)
+ANSWER_CACHE_SIZE = 256
+ANSWER_CACHE_TTL = 60.0
+
+_answer_cache: "OrderedDict[Tuple[str, Optional[str]], Tuple[float, str]]" = OrderedDict()
+_inflight: Dict[Tuple[str, Optional[str]], "asyncio.Task[Tuple[str, Optional[str]]]"] = {}
+
 
 class Question(BaseModel):
+    # Whitespace is stripped while parsing, so the endpoint only checks emptiness
+    model_config = ConfigDict(str_strip_whitespace=True)
+
     question: str
 
 
@@ -35,28 +81,91 @@ async def fetch_member_data() -> Dict[str, Any]:
     """
     Fetch member messages from the API.
     For this project we just use the first page (default skip=0, limit=100).
+
+    The last response is cached: it is revalidated with If-None-Match when the
+    API sent an ETag, otherwise reused for MEMBER_CACHE_TTL seconds.
     """
-    async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
-        try:
-            resp = await client.get(MEMBER_API_URL)
-            resp.raise_for_status()
-            data = resp.json()
+    cached: Optional[Dict[str, Any]] = _CACHE["data"]
+    etag: Optional[str] = _CACHE["etag"]
+
+    if (
+        cached is not None
+        and not etag
+        and time.monotonic() - _CACHE["fetched_at"] < MEMBER_CACHE_TTL
+    ):
+        return cached
+
+    headers = {"If-None-Match": etag} if cached is not None and etag else {}
+
+    client: httpx.AsyncClient = app.state.member_client
+    try:
+        resp = await client.get(MEMBER_API_URL, headers=headers)
+        if resp.status_code == 304 and cached is not None:
+            _CACHE["fetched_at"] = time.monotonic()
+            return cached
+
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+
+        # Ensure we always return a dict with total + items
+        items = data.get("items", []) if isinstance(data, dict) else data
+        total = data.get("total", len(items)) if isinstance(data, dict) else len(items)
+
+        etag = resp.headers.get("etag")
+        result = {"total": total, "items": items, "etag": etag}
+        # Serialized once per snapshot and reused by every question against it
+        result["context_prompt"] = format_context(result)
+        _CACHE.update(
+            etag=etag,
+            data=result,
+            fetched_at=time.monotonic(),
+        )
+        return result
 
-            # Ensure we always return a dict with total + items
-            items = data.get("items", []) if isinstance(data, dict) else data
-            total = data.get("total", len(items)) if isinstance(data, dict) else len(items)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to fetch member data: {str(e)}",
+        )
 
-            return {"total": total, "items": items}
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to fetch member data: {str(e)}",
-            )
+ANSWER_GUIDELINES = """Guidelines:
+- If the answer involves dates, provide them in a clear, readable format
+- If the answer involves counts, provide the exact number
+- If the answer involves lists (like restaurants, hobbies, etc.), list them clearly
+- If a member's name is mentioned in the question, try variations (first name only, full name, etc.)
+- If the information is not available in the messages, say "I don't have that information in the available messages"
+- Be conversational and natural in your response"""
 
 
-async def ask_claude(question: str, context: Dict[str, Any]) -> str:
-    """Use Claude to answer questions based on member data."""
+def format_context(context: Dict[str, Any]) -> str:
+    """
+    Build the static part of the prompt: instructions plus the message listing.
+    It only depends on the member data, so Claude can cache it across questions.
+    """
+    # Extract items from the response
+    items = context.get("items", []) or []
+    total = context.get("total", len(items))
+
+    # Compact JSON of the fields Claude needs; no indentation to save tokens
+    context_str = orjson.dumps(
+        [{k: item.get(k) for k in ("user_name", "message", "timestamp")} for item in items]
+    ).decode()
+
+    return f"""You are a helpful assistant that answers questions about member messages.
+
+I have {total} messages from various members. Here are the messages:
+
+{context_str}"""
+
+
+def get_context_prompt(context: Dict[str, Any]) -> str:
+    """Return the precomputed context prompt, building it if it is missing."""
+    return context.get("context_prompt") or format_context(context)
+
+
+def claude_headers() -> Dict[str, str]:
+    """Build the Anthropic request headers, failing early if the API key is missing."""
 
     # Ensure API key is present
     api_key = os.getenv("ANTHROPIC_API_KEY")
@@ -66,83 +175,293 @@ async def ask_claude(question: str, context: Dict[str, Any]) -> str:
             detail="ANTHROPIC_API_KEY is not set in the environment.",
         )
 
-    # Extract items from the response
-    items = context.get("items", []) or []
-    total = context.get("total", len(items))
+    return {
+        "Content-Type": "application/json",
+        "x-api-key": api_key,
+        "anthropic-version": "2023-06-01",
+    }
+
+
+def claude_payload(context_prompt: str, prompt: str, max_tokens: int = 1000) -> Dict[str, Any]:
+    """
+    Build a single-turn Claude request body.
+    context_prompt is marked for prompt caching; prompt carries the questions.
+    """
+    return {
+        "model": "claude-sonnet-4-20250514",
+        "max_tokens": max_tokens,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": context_prompt,
+                        "cache_control": {"type": "ephemeral"},
+                    },
+                    {"type": "text", "text": prompt},
+                ],
+            }
+        ],
+    }
 
-    # Format messages for better context
-    formatted_messages = []
-    for item in items:
-        msg = {
-            "user_name": item.get("user_name"),
-            "message": item.get("message"),
-            "timestamp": item.get("timestamp"),
-        }
-        formatted_messages.append(msg)
 
-    context_str = json.dumps(formatted_messages, indent=2)
+async def call_claude(
+    context_prompt: str,
+    prompt: str,
+    max_tokens: int = 1000,
+    timeout: float = CLAUDE_TIMEOUT,
+) -> str:
+    """Send a single-turn prompt to Claude and return the stripped text reply."""
+    headers = claude_headers()
+
+    client: httpx.AsyncClient = app.state.anthropic_client
+    try:
+        response = await client.post(
+            ANTHROPIC_API_URL,
+            headers=headers,
+            json=claude_payload(context_prompt, prompt, max_tokens),
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        result = orjson.loads(response.content)
 
-    prompt = f"""You are a helpful assistant that answers questions about member messages.
+        # Extract the answer from Claude's response
+        content = result.get("content", [])
+        if not content or "text" not in content[0]:
+            raise HTTPException(
+                status_code=500,
+                detail="Unexpected response format from Claude.",
+            )
 
-I have {total} messages from various members. Here are the messages:
+        answer_text = content[0]["text"]
+        return answer_text.strip()
+
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Claude API error: {str(e)}",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error calling Claude: {str(e)}",
+        )
 
-{context_str}
 
-Question: {question}
+def question_prompt(question: str) -> str:
+    """Build the per-question part of the prompt."""
+    return f"""Question: {question}
 
 Please analyze the member messages and provide a direct, concise answer to the question. 
 
-Guidelines:
-- If the answer involves dates, provide them in a clear, readable format
-- If the answer involves counts, provide the exact number
-- If the answer involves lists (like restaurants, hobbies, etc.), list them clearly
-- If a member's name is mentioned in the question, try variations (first name only, full name, etc.)
-- If the information is not available in the messages, say "I don't have that information in the available messages"
-- Be conversational and natural in your response
+{ANSWER_GUIDELINES}
 
 Answer only with the factual information from the data."""
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            response = await client.post(
-                ANTHROPIC_API_URL,
-                headers={
-                    "Content-Type": "application/json",
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                },
-                json={
-                    "model": "claude-sonnet-4-20250514",
-                    "max_tokens": 1000,
-                    "messages": [
-                        {"role": "user", "content": prompt}
-                    ],
-                },
-            )
+
+async def ask_claude(question: str, context: Dict[str, Any]) -> str:
+    """Use Claude to answer questions based on member data."""
+    return await call_claude(get_context_prompt(context), question_prompt(question))
+
+
+async def stream_claude(question: str, context: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Stream Claude's answer as server-sent events.
+
+    Each text delta from Claude is forwarded as `data: {"text": ...}`. Errors
+    after the stream has started are sent as an `error` event, since the
+    HTTP status has already gone out.
+    """
+    headers = claude_headers()
+    payload = claude_payload(get_context_prompt(context), question_prompt(question))
+    payload["stream"] = True
+
+    client: httpx.AsyncClient = app.state.anthropic_client
+    try:
+        async with client.stream(
+            "POST", ANTHROPIC_API_URL, headers=headers, json=payload
+        ) as response:
             response.raise_for_status()
-            result = response.json()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = orjson.loads(line[5:])
+                if event.get("type") == "content_block_delta":
+                    text = event.get("delta", {}).get("text")
+                    if text:
+                        yield f"data: {orjson.dumps({'text': text}).decode()}\n\n"
+                elif event.get("type") == "error":
+                    message = event.get("error", {}).get("message", "Unknown error")
+                    raise RuntimeError(message)
+
+        yield "event: done\ndata: {}\n\n"
+
+    except Exception as e:
+        detail = orjson.dumps({"detail": f"Error calling Claude: {str(e)}"}).decode()
+        yield f"event: error\ndata: {detail}\n\n"
+
+
+async def ask_claude_batch(questions: List[str], context: Dict[str, Any]) -> List[str]:
+    """
+    Answer several questions with one Claude call over the same member data.
+    Falls back to one call per question if the reply is not a JSON array of
+    exactly one answer per question; if the call itself fails, the error is
+    raised for the whole batch.
+    """
+    if len(questions) == 1:
+        return [await ask_claude(questions[0], context)]
 
-            # Extract the answer from Claude's response
-            content = result.get("content", [])
-            if not content or "text" not in content[0]:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Unexpected response format from Claude.",
-                )
+    # A JSON array keeps each caller's text in its own slot, whatever it contains
+    questions_json = orjson.dumps(questions).decode()
 
-            answer_text = content[0]["text"]
-            return answer_text.strip()
+    prompt = f"""Questions (a JSON array of {len(questions)} strings):
+{questions_json}
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Claude API error: {str(e)}",
-            )
+Please analyze the member messages and provide a direct, concise answer to each question independently.
+
+{ANSWER_GUIDELINES}
+
+Respond with only a JSON array of {len(questions)} strings, where the string at index i is the answer to the question at index i. Answer only with the factual information from the data."""
+
+    reply = await call_claude(
+        get_context_prompt(context),
+        prompt,
+        max_tokens=1000 * len(questions),
+        timeout=CLAUDE_TIMEOUT * len(questions),
+    )
+
+    try:
+        answers = orjson.loads(reply[reply.index("["):reply.rindex("]") + 1])
+    except ValueError:
+        answers = None
+
+    if (
+        not isinstance(answers, list)
+        or len(answers) != len(questions)
+        or not all(isinstance(a, str) for a in answers)
+    ):
+        return list(await asyncio.gather(*(ask_claude(q, context) for q in questions)))
+
+    return [a.strip() for a in answers]
+
+
+class AsyncBatcher(ABC, Generic[T, R]):
+    """
+    Coalesce concurrent process() calls into batches.
+
+    A batch is flushed once it holds max_batch_size items or max_queue_time
+    seconds after its first item arrived, whichever comes first. Subclasses
+    implement process_batch(), returning one result per item in order.
+    """
+
+    def __init__(self, max_batch_size: int = 8, max_queue_time: float = 0.2):
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def process(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_queue_time, self._flush)
+
+        return await future
+
+    @abstractmethod
+    async def process_batch(self, items: List[T]) -> List[R]:
+        """Return one result per item, in the same order."""
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        try:
+            results = await self.process_batch([item for item, _ in batch])
         except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error calling Claude: {str(e)}",
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+        if len(results) != len(batch):
+            error = RuntimeError(
+                f"process_batch returned {len(results)} results for {len(batch)} items"
             )
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+
+
+class QuestionBatcher(AsyncBatcher[str, Tuple[str, Optional[str]]]):
+    """
+    Answer questions that arrive close together with a single Claude call.
+    Each result is (answer, ETag of the member data it was built from).
+    """
+
+    async def process_batch(self, items: List[str]) -> List[Tuple[str, Optional[str]]]:
+        member_data = await fetch_member_data()
+        answers = await ask_claude_batch(items, member_data)
+        return [(answer, member_data.get("etag")) for answer in answers]
+
+
+question_batcher = QuestionBatcher(max_batch_size=8, max_queue_time=0.2)
+
+
+async def answer_question(question: str) -> str:
+    """
+    Answer a question, sharing work between identical questions.
+
+    Recent answers are served from a small LRU cache, and a question that is
+    already being answered waits on the in-flight task instead of asking
+    Claude again. Answers are cached under the ETag of the snapshot they
+    were built from, and looked up under the latest known ETag.
+    """
+    key = (question, _CACHE["etag"])
+
+    cached = _answer_cache.get(key)
+    if cached is not None and time.monotonic() - cached[0] < ANSWER_CACHE_TTL:
+        _answer_cache.move_to_end(key)
+        return cached[1]
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(question_batcher.process(question))
+        _inflight[key] = task
+
+        def _done(t: "asyncio.Task[Tuple[str, Optional[str]]]") -> None:
+            _inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None:
+                answer, etag = t.result()
+                cache_key = (question, etag)
+                _answer_cache[cache_key] = (time.monotonic(), answer)
+                _answer_cache.move_to_end(cache_key)
+                while len(_answer_cache) > ANSWER_CACHE_SIZE:
+                    _answer_cache.popitem(last=False)
+
+        task.add_done_callback(_done)
+
+    # Shielded so one client disconnecting doesn't cancel the others' answer
+    answer, _ = await asyncio.shield(task)
+    return answer
 
 
 @app.get("/")
@@ -153,6 +472,7 @@ async def root():
         "service": "Member QA System",
         "endpoints": {
             "/ask": "POST - Ask questions about member data",
+            "/ask/stream": "POST - Ask a question, streaming the answer as server-sent events",
             "/health": "GET - Health check",
         },
     }
@@ -174,16 +494,33 @@ async def ask_question(question: Question):
     - How many cars does Vikram Desai have?
     - What are Amira's favorite restaurants?
     """
-    if not question.question or not question.question.strip():
+    if not question.question:
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
-    # Fetch member data
-    member_data = await fetch_member_data()
+    # Questions arriving together share one member data fetch and Claude call
+    answer = await answer_question(question.question)
 
-    # Ask Claude to answer the question
-    answer = await ask_claude(question.question, member_data)
+    # The answer is a server-generated str; skip re-validating it
+    return Answer.model_construct(answer=answer)
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(question: Question):
+    """
+    Answer a question, streaming the answer as server-sent events as Claude
+    generates it. Streamed questions bypass batching and the answer cache.
+    """
+    if not question.question:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    # Fail before streaming starts so these errors keep their HTTP status
+    member_data = await fetch_member_data()
+    claude_headers()
 
-    return Answer(answer=answer)
+    return StreamingResponse(
+        stream_claude(question.question, member_data),
+        media_type="text/event-stream",
+    )
 
 
 if __name__ == "__main__":
@@ -3,16 +3,38 @@
 Test script for the Member QA System API
 """
 import asyncio
-import json
+import contextlib
+import datetime
+import email.utils
+import io
+import logging
+import math
+import re
+import sys
+import time
+from typing import Optional
 
 import httpx
+import orjson
+
+logger = logging.getLogger("qa_test")
 
 # Configuration
 API_BASE_URL = API_BASE_URL = "https://member-qa-system-production-8c5a.up.railway.app"
 
+# Error detail our service returns when the public /messages API failed
+_UPSTREAM_RE = re.compile(
+    r"Failed to fetch member data.*november7-730026606190\.europe-west1\.run\.app/messages",
+    re.S,
+)
+
+# Section separators for the report
+SEP_EQ = "=" * 80
+SEP_HASH = "#" * 80
+
 
 # Test questions based on the API structure
-TEST_QUESTIONS = [
+TEST_QUESTIONS = (
     "When is Layla planning her trip to London?",
     "How many cars does Vikram Desai have?",
     "What are Amira's favorite restaurants?",
@@ -20,193 +42,366 @@ TEST_QUESTIONS = [
     "What activities or hobbies are mentioned?",
     "Are there any upcoming events or trips mentioned?",
     "Who mentioned food or restaurants?",
-]
+)
+TOTAL_QUESTIONS = len(TEST_QUESTIONS)
 
+# Retries for a question the server rejects with 429/503
+MAX_RETRIES = 3
 
-async def test_health_check() -> bool:
-    """Test the health check endpoint."""
-    print("Testing health check endpoint...")
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f"{API_BASE_URL}/health")
-            response.raise_for_status()
-            print(f"✓ Health check passed: {response.json()}")
-            return True
-        except Exception as e:
-            print(f"✗ Health check failed: {e}")
-            return False
+# Throwaway question sent at startup to warm the server and its /messages fetch
+WARMUP_QUESTION = "ping"
+
+# Overall deadline (seconds) for one /ask attempt, enforced with asyncio.timeout;
+# httpx itself only bounds connecting for these calls
+ASK_TIMEOUT = 90.0
+ASK_HTTP_TIMEOUT = httpx.Timeout(None, connect=10.0)
+
+
+class RateLimiter:
+    """
+    Lets requests through freely until the server pushes back.
+
+    After a 429/503, every caller waits until the server's Retry-After (or an
+    exponential backoff when it sends none) has passed. Retry-After may be
+    either delay-seconds or an HTTP-date.
+    """
+
+    def __init__(self) -> None:
+        self._open = asyncio.Event()
+        self._open.set()
+        self._reopen_at = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self) -> None:
+        await self._open.wait()
+
+    def back_off(self, response: httpx.Response, attempt: int) -> None:
+        delay = _retry_after(response.headers.get("retry-after", ""))
+        if delay is None:
+            delay = 2.0 ** attempt
+
+        loop = asyncio.get_running_loop()
+        reopen_at = loop.time() + delay
+        if reopen_at <= self._reopen_at:
+            return
+
+        # Only one pending reopen, always for the latest deadline
+        if self._timer is not None:
+            self._timer.cancel()
+        self._reopen_at = reopen_at
+        self._open.clear()
+        self._timer = loop.call_at(reopen_at, self._reopen)
+
+    def _reopen(self) -> None:
+        # Event loops may fire timers slightly early; trust the timer anyway
+        self._timer = None
+        self._open.set()
+
+
+def _retry_after(value: str) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, or None if it can't be parsed."""
+    try:
+        delay = float(value)
+    except ValueError:
+        pass
+    else:
+        return max(0.0, delay) if math.isfinite(delay) else None
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        # HTTP-dates are always GMT
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+
+rate_limiter = RateLimiter()
 
 
-async def test_ask_question(question: str):
+async def test_health_check(client: httpx.AsyncClient) -> bool:
+    """Test the health check endpoint."""
+    logger.info("Testing health check endpoint...")
+    try:
+        response = await client.get(f"{API_BASE_URL}/health")
+        response.raise_for_status()
+        logger.info("✓ Health check passed: %s", response.json())
+        return True
+    except Exception as e:
+        logger.error("✗ Health check failed: %s", e)
+        return False
+
+
+async def test_ask_question(client: httpx.AsyncClient, question: str, label: str = ""):
     """
     Test asking a question.
 
+    Output is buffered and written in one go when the test finishes, so
+    concurrent tests don't interleave.
+
     Returns:
         (success: bool, upstream_issue: bool)
         success=True  -> /ask behaved correctly and returned an answer
         upstream_issue=True -> /ask failed only because the external /messages API errored
     """
-    print(f"\n{'=' * 80}")
-    print(f"Question: {question}")
-    print(f"{'=' * 80}")
-
-    async with httpx.AsyncClient(timeout=90.0) as client:  # Increased timeout
-        try:
-            response = await client.post(
-                f"{API_BASE_URL}/ask",
-                json={"question": question},
-            )
-            response.raise_for_status()
-            result = response.json()
-
-            # Safely get the answer
-            answer = result.get("answer", "<No 'answer' field in response>")
-            preview = answer[:200] + "..." if len(answer) > 200 else answer
-            print(f"Answer: {preview}")
-            print("Status: ✓ Success")
-            return True, False
-
-        except httpx.TimeoutException:
-            print("Status: ✗ Timeout (request took too long)")
-            print(
-                "Note: This might work with a longer timeout or fewer consecutive requests."
-            )
-            return False, False
-
-        except httpx.HTTPStatusError as e:
-            status_code = e.response.status_code
-            print(f"Status: ✗ HTTP Error {status_code}")
-
-            upstream_issue = False
-            try:
-                error_detail = e.response.json()
-                detail_msg = error_detail.get("detail", e.response.text)
-            except Exception:
-                detail_msg = e.response.text
-
-            print(f"Error: {detail_msg}")
-
-            # Detect the common upstream error pattern:
-            # our service couldn't fetch member data because the public /messages API
-            # returned a 4xx (400/401/402/403...)
-            if (
-                "Failed to fetch member data" in detail_msg
-                and "november7-730026606190.europe-west1.run.app/messages" in detail_msg
-            ):
-                upstream_issue = True
-                print(
-                    "Note: This looks like a transient or permission error from the "
-                    "public /messages API, not from your service logic."
-                )
-                print(
-                    "      You can rerun the tests or mention this upstream limitation "
-                    "in your README."
+    buf = io.StringIO()
+    result = (False, False)
+    try:
+        result = await _ask_question(client, question, label, buf)
+        return result
+    finally:
+        # One log record per test; failures are logged as errors
+        logger.log(
+            logging.INFO if result[0] else logging.ERROR,
+            "%s",
+            buf.getvalue().rstrip("\n"),
+        )
+
+
+async def _ask_question(
+    client: httpx.AsyncClient, question: str, label: str, buf: io.StringIO
+):
+    if label:
+        print(f"\n{label}", file=buf)
+    print(f"\n{SEP_EQ}", file=buf)
+    print(f"Question: {question}", file=buf)
+    print(SEP_EQ, file=buf)
+
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            # The deadline starts once the rate limiter lets us through, so
+            # honouring a long Retry-After isn't reported as a timeout
+            await rate_limiter.acquire()
+            async with asyncio.timeout(ASK_TIMEOUT):
+                response = await client.post(
+                    f"{API_BASE_URL}/ask",
+                    content=orjson.dumps({"question": question}),
+                    headers={"content-type": "application/json"},
+                    timeout=ASK_HTTP_TIMEOUT,
                 )
+            if response.status_code not in (429, 503) or attempt == MAX_RETRIES:
+                break
+            rate_limiter.back_off(response, attempt)
+
+        if response.status_code >= 400:
+            return _handle_http_error(response, buf)
+
+        result = orjson.loads(response.content)
+
+        # Safely get the answer
+        answer = result.get("answer", "<No 'answer' field in response>")
+        preview = answer if len(answer) <= 200 else f"{answer[:200]}..."
+        print(f"Answer: {preview}", file=buf)
+        print("Status: ✓ Success", file=buf)
+        return True, False
+
+    except (TimeoutError, httpx.TimeoutException):
+        print("Status: ✗ Timeout (request took too long)", file=buf)
+        print(
+            "Note: This might work with a longer timeout or fewer consecutive requests.",
+            file=buf,
+        )
+        return False, False
+
+    except Exception as e:
+        print("Status: ✗ Failed", file=buf)
+        print(f"Error: {str(e)}", file=buf)
+        return False, False
+
+
+def _handle_http_error(response: httpx.Response, buf: io.StringIO):
+    """Report an error status from /ask; returns (success, upstream_issue)."""
+    print(f"Status: ✗ HTTP Error {response.status_code}", file=buf)
+
+    upstream_issue = False
+    try:
+        error_detail = orjson.loads(response.content)
+        detail_msg = error_detail.get("detail", response.text)
+    except (orjson.JSONDecodeError, AttributeError):
+        detail_msg = response.text
+
+    print(f"Error: {detail_msg}", file=buf)
+
+    if response.status_code in (429, 503):
+        print(
+            f"Note: Still rate limited after {MAX_RETRIES} retries; "
+            "the server asked us to back off.",
+            file=buf,
+        )
+
+    # Detect the common upstream error pattern:
+    # our service couldn't fetch member data because the public /messages API
+    # returned a 4xx (400/401/402/403...)
+    if isinstance(detail_msg, str) and _UPSTREAM_RE.search(detail_msg):
+        upstream_issue = True
+        print(
+            "Note: This looks like a transient or permission error from the "
+            "public /messages API, not from your service logic.",
+            file=buf,
+        )
+        print(
+            "      You can rerun the tests or mention this upstream limitation "
+            "in your README.",
+            file=buf,
+        )
+
+    return False, upstream_issue
+
+
+async def test_invalid_request(client: httpx.AsyncClient) -> bool:
+    """Test with invalid request (empty question)."""
+    buf = io.StringIO()
+    passed = False
+    print(f"\n{SEP_EQ}", file=buf)
+    print("Testing invalid request (empty question)...", file=buf)
+    print(SEP_EQ, file=buf)
+
+    try:
+        response = await client.post(
+            f"{API_BASE_URL}/ask",
+            json={"question": ""},
+        )
+        if response.status_code == 400:
+            print("✓ Correctly rejected empty question", file=buf)
+            passed = True
+            return True
+        else:
+            print(f"✗ Unexpected status code: {response.status_code}", file=buf)
+            print(f"Body: {response.text}", file=buf)
+            return False
+    except Exception as e:
+        print(f"✗ Error: {e}", file=buf)
+        return False
+    finally:
+        # Logged in one go, since this runs alongside the question tests
+        logger.log(
+            logging.INFO if passed else logging.ERROR,
+            "%s",
+            buf.getvalue().rstrip("\n"),
+        )
+
+
+async def run_valid_questions(client: httpx.AsyncClient) -> tuple[list[bool], list[bool]]:
+    """
+    Ask every TEST_QUESTION concurrently.
 
-            return False, upstream_issue
+    Returns:
+        (results, upstream_issues), indexed like TEST_QUESTIONS
+    """
+    logger.info("\n%s\nTesting valid questions...\n%s", SEP_EQ, SEP_EQ)
 
-        except Exception as e:
-            print("Status: ✗ Failed")
-            print(f"Error: {str(e)}")
-            return False, False
+    results = [False] * TOTAL_QUESTIONS
+    upstream_issues = [False] * TOTAL_QUESTIONS
 
+    async def ask(index: int, question: str) -> tuple[int, tuple[bool, bool]]:
+        label = f"[Test {index + 1}/{TOTAL_QUESTIONS}]"
+        return index, await test_ask_question(client, question, label)
 
-async def test_invalid_request() -> bool:
-    """Test with invalid request (empty question)."""
-    print(f"\n{'=' * 80}")
-    print("Testing invalid request (empty question)...")
-    print(f"{'=' * 80}")
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{API_BASE_URL}/ask",
-                json={"question": ""},
-            )
-            if response.status_code == 400:
-                print("✓ Correctly rejected empty question")
-                return True
-            else:
-                print(f"✗ Unexpected status code: {response.status_code}")
-                print(f"Body: {response.text}")
-                return False
-        except Exception as e:
-            print(f"✗ Error: {e}")
-            return False
+    # The questions are independent, so send them all at once and collect
+    # each result as soon as it finishes
+    tasks = [
+        asyncio.create_task(ask(index, question))
+        for index, question in enumerate(TEST_QUESTIONS)
+    ]
+    for next_done in asyncio.as_completed(tasks):
+        index, (success, upstream_issue) = await next_done
+        results[index] = success
+        upstream_issues[index] = upstream_issue
+
+    return results, upstream_issues
 
 
 async def main() -> None:
     """Run all tests."""
-    print(f"\n{'#' * 80}")
-    print("# Member QA System - API Tests")
-    print(f"# Testing against: {API_BASE_URL}")
-    print(f"{'#' * 80}\n")
-
-    # Test health check
-    health_ok = await test_health_check()
-    if not health_ok:
-        print("\n⚠️  Health check failed. Is the service running?")
-        return
-
-    # Small delay after health check
-    await asyncio.sleep(1)
-
-    # Test valid questions
-    print("\n" + "=" * 80)
-    print("Testing valid questions...")
-    print("=" * 80)
-
-    results: list[bool] = []
-    upstream_issues: list[bool] = []
-
-    for i, question in enumerate(TEST_QUESTIONS, 1):
-        print(f"\n[Test {i}/{len(TEST_QUESTIONS)}]")
-        success, upstream_issue = await test_ask_question(question)
-        results.append(success)
-        upstream_issues.append(upstream_issue)
-
-        # Add delay between requests to avoid rate limiting
-        if i < len(TEST_QUESTIONS):
-            print("\nWaiting 3 seconds before next request...")
-            await asyncio.sleep(3)
-
-    # Test invalid request
-    await asyncio.sleep(2)
-    invalid_result = await test_invalid_request()
-
-    # Summary
-    print("\n" + "=" * 80)
-    print("Test Summary")
-    print("=" * 80)
-    total = len(results)
+    logger.info(
+        "\n%s\n# Member QA System - API Tests\n# Testing against: %s\n%s\n",
+        SEP_HASH,
+        API_BASE_URL,
+        SEP_HASH,
+    )
+
+    # One pooled client for the whole run, so connections are reused. With
+    # HTTP/2 the concurrent questions are multiplexed over a single connection;
+    # over HTTP/1.1 the pool caps concurrent handshakes and keeps them alive.
+    # Failed connection attempts are retried before they surface as failures.
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=2,
+        limits=httpx.Limits(
+            max_connections=8, max_keepalive_connections=8, keepalive_expiry=120.0
+        ),
+    )
+    async with httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(90.0, connect=10.0),
+    ) as client:
+        # Warm up the service (cold start, upstream fetch) while the health check
+        # runs; the response is discarded. This goes through /ask/stream, which
+        # bypasses batching, so the ping doesn't join the first batch of tests
+        warmup_task = asyncio.create_task(
+            client.post(f"{API_BASE_URL}/ask/stream", json={"question": WARMUP_QUESTION})
+        )
+
+        # Test health check
+        health_ok = await test_health_check(client)
+        if not health_ok:
+            warmup_task.cancel()
+            logger.error("\n⚠️  Health check failed. Is the service running?")
+            return
+
+        # Test valid questions and the invalid request side by side; they
+        # don't depend on each other
+        valid_task = asyncio.create_task(run_valid_questions(client))
+        invalid_task = asyncio.create_task(test_invalid_request(client))
+        (results, upstream_issues), invalid_result = await asyncio.gather(
+            valid_task, invalid_task
+        )
+
+        with contextlib.suppress(Exception):
+            await warmup_task
+
+    # Summary (logged as warnings so it still shows when INFO is filtered out)
+    logger.warning("\n%s\nTest Summary\n%s", SEP_EQ, SEP_EQ)
+    total = TOTAL_QUESTIONS
     passed = sum(results)
     upstream_count = sum(upstream_issues)
 
-    print(f"Questions tested: {total}")
-    print(f"Passed: {passed}")
-    print(f"Failed: {total - passed}")
+    logger.warning("Questions tested: %d", total)
+    logger.warning("Passed: %d", passed)
+    logger.warning("Failed: %d", total - passed)
     if upstream_count:
-        print(f"Of the failures, {upstream_count} were due to upstream /messages API issues.")
-    print(f"Success rate: {(passed / total) * 100:.1f}%")
+        logger.warning(
+            "Of the failures, %d were due to upstream /messages API issues.", upstream_count
+        )
+    logger.warning("Success rate: %.1f%%", (passed / total) * 100)
 
     if invalid_result:
-        print("Invalid request handling: ✓ Passed")
+        logger.warning("Invalid request handling: ✓ Passed")
     else:
-        print("Invalid request handling: ✗ Failed")
+        logger.warning("Invalid request handling: ✗ Failed")
 
-    print("\n✓ All tests completed!")
+    logger.warning("\n✓ All tests completed!")
 
     if passed == total and invalid_result:
-        print("\n🎉 All tests passed! Your API is working perfectly!")
+        logger.warning("\n🎉 All tests passed! Your API is working perfectly!")
     elif passed >= total * 0.8:
-        print("\n✅ Most tests passed! Your API is working well.")
+        logger.warning("\n✅ Most tests passed! Your API is working well.")
     else:
-        print("\n⚠️  Some tests failed. Check the errors above.")
+        logger.warning("\n⚠️  Some tests failed. Check the errors above.")
         if upstream_count:
-            print(
+            logger.warning(
                 "   Note: Some failures are due to the external /messages API, not your service."
             )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    # httpx logs every request at INFO; keep the report readable
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    try:
+        import uvloop  # optional and POSIX-only: pip install uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())